@@ -3,28 +3,58 @@ from agent_framework.openai import OpenAIChatClient
 from agent_framework.azure import AzureOpenAIChatClient
 from dotenv import load_dotenv
 import os
+from dataclasses import dataclass
 from agent_framework import WorkflowViz
 
 load_dotenv()
 
-endpoint = os.environ["AZURE_OPENAI_ENDPOINT"]
-deployment_name = os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"]
-api_key = os.environ["AZURE_OPENAI_API_KEY"]
 
-chat_client = AzureOpenAIChatClient(
-    deployment_name=deployment_name,
-    endpoint=endpoint,
-    api_key=api_key,
-)
+@dataclass(frozen=True, slots=True)
+class _Env:
+    """起動時に読み込むAzure OpenAIの設定。"""
+
+    endpoint: str
+    deployment: str
+
+
+def _load_env() -> _Env:
+    """必要な環境変数を検証し、不足があれば実行前に分かりやすいエラーで終了する。"""
+    
+    missing = [
+        key
+        for key in ("AZURE_OPENAI_ENDPOINT", "AZURE_OPENAI_CHAT_DEPLOYMENT_NAME")
+        if key not in os.environ
+    ]
+    if missing:
+        raise RuntimeError(f"環境変数が設定されていません: {missing} (.envを確認してください)")
+    return _Env(
+        endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+        deployment=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"],
+    )
+
+
+ENV = _load_env()
 
 import asyncio
-from dataclasses import dataclass
-from typing import cast
+import functools
+import hashlib
+import json
+import re
+import sys
+import uuid
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, cast
 
 from agent_framework import (
     AgentExecutor,
     AgentExecutorRequest,
     AgentExecutorResponse,
+    AgentRunResponse,
+    AgentRunUpdateEvent,
+    ChatAgent,
     ChatMessage,
     Executor,
     RequestInfoEvent,
@@ -32,6 +62,7 @@ from agent_framework import (
     RequestInfoMessage,
     RequestResponse,
     Role,
+    Workflow,
     WorkflowBuilder,
     WorkflowContext,
     WorkflowOutputEvent,
@@ -40,7 +71,14 @@ from agent_framework import (
     handler,
 )
 from agent_framework.azure import AzureOpenAIChatClient
-from azure.identity import AzureCliCredential
+from azure.identity import AzureCliCredential, get_bearer_token_provider
+from openai import AsyncAzureOpenAI
+from pydantic import BaseModel, ValidationError
+
+try:
+    import orjson
+except ImportError:  # orjsonがない場合は標準のjsonモジュールを使用
+    orjson = None
 
 """
 Sample: Writer-Reviewer Workflow with Human-in-the-Loop Approval
@@ -64,9 +102,133 @@ Sample: Writer-Reviewer Workflow with Human-in-the-Loop Approval
 - Azure OpenAIの設定と必要な環境変数の構成
 - azure-identityによる認証。実行前に `az login` を実行
 - WorkflowBuilder、エグゼキューター、エッジ、イベント、ストリーミング実行の基本知識
+
+実行方法:
+- python human-in-the-loop.py                     既定のタスクを1件実行
+- python human-in-the-loop.py "タスク1" "タスク2"   指定したタスクを並行実行 (run_batch)
 """
 
 
+# az login のサインイン情報から取得する資格情報。プロセス内で1度だけ作成し、
+# チャットとBatch APIのクライアントでトークンプロバイダーを共有する (トークンは期限切れの前に自動更新)
+_CREDENTIAL = AzureCliCredential()
+_TOKEN_PROVIDER = get_bearer_token_provider(_CREDENTIAL, "https://cognitiveservices.azure.com/.default")
+
+# コンソール出力の区切り線と、固定の見出し
+_SEP = "=" * 60
+_HEADER_FINAL_OUTPUT = f"\n{_SEP}\n✨ 最終承認コンテンツ\n{_SEP}"
+_HEADER_UNAPPROVED_OUTPUT = f"\n{_SEP}\n⚠️ 未承認コンテンツ (反復回数の上限に到達)\n{_SEP}"
+_FOOTER_COMPLETED = f"\n{_SEP}\nワークフロー完了!\n{_SEP}"
+
+# "1" の場合、run_batch実行時のReviewerをBatch API経由にする (約50%のコスト削減、完了まで最大24時間)
+REVIEWER_BATCH_MODE = os.getenv("REVIEWER_BATCH_MODE") == "1"
+
+# "1" の場合、Reviewerを使わず、Writerが下書きと自己レビューを1回のLLM呼び出しで構造化出力として返す
+COMPACT_MODE = os.getenv("COMPACT_MODE") == "1"
+
+WRITER_INSTRUCTIONS = (
+    "あなたは優秀なコンテンツライターです。"
+    "明確で魅力的なコンテンツを作成し、フィードバックに基づいて改善してください。"
+    "修正を依頼された場合は、会話履歴にある直前のあなたの下書きを基に修正し、"
+    "下書きの再送を求めないでください。"
+)
+
+COMPACT_WRITER_INSTRUCTIONS = WRITER_INSTRUCTIONS + (
+    "\n下書きを書いた後、明確さ・完全性・正確性の観点から簡潔に自己レビューしてください。"
+    "下書きはdraftに、自己レビューはself_reviewに入れて返してください。"
+)
+
+REVIEWER_INSTRUCTIONS = (
+    "あなたは経験豊富なコンテンツレビューアーです。"
+    "以下の観点から評価し、実行可能なフィードバックを提供してください:\n"
+    "1. 明確さ - 理解しやすいか?\n"
+    "2. 完全性 - トピックを十分にカバーしているか?\n"
+    "3. 正確性 - 情報は正しいか?\n"
+    "フィードバックは簡潔にしてください。"
+)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 下書き本文のSHA-256 → Reviewerのフィードバック。同一の下書きに対するReviewer呼び出しを省略する
+# プロセス内の全ワークフローで共有するため、最近使われた _REVIEW_CACHE_MAX_SIZE 件だけを保持する
+_REVIEW_CACHE_MAX_SIZE = 1024
+_review_cache: OrderedDict[str, str] = OrderedDict()
+
+
+def _draft_key(draft_content: str) -> str:
+    return hashlib.sha256(draft_content.encode("utf-8")).hexdigest()
+
+
+def _get_cached_review(draft_content: str) -> str | None:
+    key = _draft_key(draft_content)
+    reviewer_feedback = _review_cache.get(key)
+    if reviewer_feedback is not None:
+        _review_cache.move_to_end(key)
+    return reviewer_feedback
+
+
+def _cache_review(draft_content: str, reviewer_feedback: str) -> None:
+    key = _draft_key(draft_content)
+    _review_cache[key] = reviewer_feedback
+    _review_cache.move_to_end(key)
+    if len(_review_cache) > _REVIEW_CACHE_MAX_SIZE:
+        _review_cache.popitem(last=False)
+
+
+# Writer/Reviewerのループの上限。人間が承認しない場合でも、この回数で最新の下書きを出力して終了する
+MAX_ITERATIONS = 5
+
+# 承認とみなす人間の入力 (前後の空白と大文字・小文字は無視)
+_APPROVE_RE = re.compile(r"^\s*(?:approve|approved|ok|yes|承認|👍)\s*$", re.IGNORECASE)
+
+# 短い、またはこれらの語で始まる修正指示は軽微とみなし、次の反復ではReviewerを省略する
+# 日本語は1文字あたりの情報量が多いため、長さの上限は文字数で小さめに設定する (MINOR_REVISION_MAX_LENGTHで変更可)
+_MINOR_REVISION_RE = re.compile(r"(?:shorten|add|remove)\b|短く|追加|削除", re.IGNORECASE)
+_MINOR_REVISION_MAX_LENGTH = int(os.getenv("MINOR_REVISION_MAX_LENGTH", "15"))
+_SKIPPED_REVIEW_FEEDBACK = "(軽微な修正指示のため、Reviewerによるレビューを省略しました)"
+
+
+def _is_minor_revision(instruction: str) -> bool:
+    instruction = instruction.strip()
+    if not instruction:
+        return False
+    return (
+        len(instruction) < _MINOR_REVISION_MAX_LENGTH
+        or _MINOR_REVISION_RE.match(instruction) is not None
+    )
+
+
+class CompactDraft(BaseModel):
+    """コンパクトモードのWriterが構造化出力 (response_format) で返す下書きと自己レビュー。"""
+
+    draft: str
+    self_review: str
+
+
+def _parse_compact_response(response: AgentRunResponse) -> tuple[str, str]:
+    """コンパクトモードのWriterの応答から、下書きと自己レビューを取り出す。"""
+    
+    result = response.value
+    if not isinstance(result, CompactDraft):
+        try:
+            result = CompactDraft.model_validate_json(response.text)
+        except ValidationError:
+            # 構造化出力として解釈できない場合は、応答全体を下書きとして扱う
+            return response.text, ""
+    return result.draft, result.self_review
+
+
 @dataclass
 class HumanReviewRequest(RequestInfoMessage):
     """人間のレビューアーに送信されるリクエストメッセージ。
@@ -75,60 +237,187 @@ class HumanReviewRequest(RequestInfoMessage):
     強い型付け、将来互換性のある検証、明確な相関セマンティクスを提供します。
     """
 
-    prompt: str = ""  # この行を追加
+    prompt: str = (
+        "レビュー結果を確認してください。\n"
+        "'approve' で承認、または修正指示を入力してください。"
+    )
     draft_content: str = ""
     reviewer_feedback: str = ""
     iteration: int = 1
 
 
-class ReviewCoordinator(Executor):
+@dataclass(slots=True)
+class _WorkflowState:
+    """ReviewCoordinatorが1回のワークフロー実行の間に保持する状態。"""
+
+    current_draft: str = ""
+    reviewer_feedback: str = ""
+    skip_reviewer: bool = False
+
+
+@dataclass(slots=True)
+class ReviewResult:
+    """ワークフローの最終出力。
+
+    approved が False の場合は、人間が承認しないまま反復回数の上限に達し、
+    最後に人間へ提示した下書きをそのまま返したことを示します。
+    """
+
+    content: str
+    approved: bool = True
+
+
+class CachedStateExecutor(Executor):
+    """エグゼキューターの状態を1つの_WorkflowStateとしてキャッシュする基底クラス。
+    
+    状態は最初のアクセス時にだけ ctx.get_state() から読み込み、以降はその属性を直接更新します。
+    変更はハンドラーの最後に _flush_state() で1度だけ書き戻します。
+    エグゼキューターはワークフローの実行ごとに作成されるため、キャッシュが実行間で共有されることはありません。
+    """
+
+    def __init__(self, id: str):
+        super().__init__(id=id)
+        self._cached_state: _WorkflowState | None = None
+
+    async def _state(self, ctx: WorkflowContext[Any]) -> _WorkflowState:
+        if self._cached_state is None:
+            self._cached_state = _WorkflowState(**(await ctx.get_state() or {}))
+        return self._cached_state
+
+    async def _flush_state(self, ctx: WorkflowContext[Any]) -> None:
+        # チェックポイントに保存できるよう、ctx.set_state()には辞書として渡す
+        if self._cached_state is not None:
+            await ctx.set_state(asdict(self._cached_state))
+
+
+class ReviewCoordinator(CachedStateExecutor):
     """レビューフローを調整し、人間の承認を管理するエグゼキューター。
     
     責務:
+    - Writerの下書きを保存し、Reviewerにレビューを依頼する
     - Reviewerからのフィードバックを受け取る
     - 人間のレビューアーにHumanReviewRequestを送信
     - 人間の決定に基づいて、完了またはWriterへの再作成指示を行う
+    
+    同じ下書きが既にレビュー済みの場合や、直前の人間の修正指示が軽微な場合は、
+    Reviewerを呼び出さずに人間の承認を要求します。
+    reviewer_idがNoneの場合 (コンパクトモード) は、Writerが構造化出力で返した自己レビューを
+    フィードバックとして使用します。
+    人間が max_iterations 回レビューしても承認しない場合は、最後に提示した下書きを未承認として出力して終了します。
     """
 
-    def __init__(self, writer_id: str, request_info_id: str, coordinator_id: str = "review_coordinator"):
+    def __init__(
+        self,
+        writer_id: str,
+        reviewer_id: str | None,
+        request_info_id: str,
+        coordinator_id: str = "review_coordinator",
+        max_iterations: int = MAX_ITERATIONS,
+    ):
         super().__init__(id=coordinator_id)
         self._writer_id = writer_id
+        self._reviewer_id = reviewer_id
         self._request_info_id = request_info_id
+        self._max_iterations = max_iterations
+        # エグゼキューターはワークフローの実行ごとに作成されるため、反復回数は属性で数える
+        self._iteration = 0
 
     @handler
-    async def handle_reviewer_response(
+    async def handle_agent_response(
+        self,
+        response: AgentExecutorResponse,
+        ctx: WorkflowContext[AgentExecutorRequest | HumanReviewRequest],
+    ) -> None:
+        """WriterまたはReviewerの応答を、送信元に応じて処理する。"""
+        
+        if ctx.get_source_executor_id() == self._writer_id:
+            await self._handle_writer_response(response, ctx)
+        else:
+            await self._handle_reviewer_response(response, ctx)
+
+    async def _handle_writer_response(
         self,
         response: AgentExecutorResponse,
-        ctx: WorkflowContext[HumanReviewRequest],
+        ctx: WorkflowContext[AgentExecutorRequest | HumanReviewRequest],
     ) -> None:
-        """Reviewerのフィードバックを処理し、人間の承認を要求する。"""
+        """Writerの下書きを保存し、Reviewerに送信する。"""
+        
+        # 下書きの本文は、単独実行時は生成中に_run_oneがストリーミング表示し、
+        # 並行実行時は人間への確認依頼と一緒に表示される
+        draft_content = response.agent_run_response.text or ""
+        self_review: str | None = None
+        if self._reviewer_id is None:
+            draft_content, self_review = _parse_compact_response(response.agent_run_response)
+        
+        # 下書きを状態に保存
+        state = await self._state(ctx)
+        state.current_draft = draft_content
+        
+        if self_review is not None:
+            await self._request_human_review(self_review, ctx)
+            return
+        
+        if state.skip_reviewer:
+            state.skip_reviewer = False
+            print("\n⏩ 軽微な修正指示のため、Reviewerを省略します")
+            await self._request_human_review(_SKIPPED_REVIEW_FEEDBACK, ctx)
+            return
+        
+        cached_feedback = _get_cached_review(draft_content)
+        if cached_feedback is not None:
+            print("\n♻️ 同じ下書きのレビュー結果を再利用します")
+            await self._request_human_review(cached_feedback, ctx)
+            return
+        
+        await self._flush_state(ctx)
+        
+        # Reviewerにレビュー依頼を送信
+        review_request = (
+            f"以下のコンテンツをレビューし、品質、明確さ、正確性について"
+            f"簡潔なフィードバックを提供してください:\n\n{draft_content}"
+        )
         
-        # 現在の状態を取得して反復回数を追跡
-        state = await ctx.get_state() or {}
-        draft_content = cast(str, state.get("current_draft", ""))
-        iteration = int(state.get("iteration", 0)) + 1
+        await ctx.send_message(
+            AgentExecutorRequest(
+                messages=[ChatMessage(Role.USER, text=review_request)],
+                should_respond=True,
+            ),
+            target_id=self._reviewer_id,
+        )
+
+    async def _handle_reviewer_response(
+        self,
+        response: AgentExecutorResponse,
+        ctx: WorkflowContext[AgentExecutorRequest | HumanReviewRequest],
+    ) -> None:
+        """Reviewerのフィードバックをキャッシュし、人間の承認を要求する。"""
         
+        state = await self._state(ctx)
         reviewer_feedback = response.agent_run_response.text or ""
+        _cache_review(state.current_draft, reviewer_feedback)
+        
+        await self._request_human_review(reviewer_feedback, ctx)
+
+    async def _request_human_review(
+        self,
+        reviewer_feedback: str,
+        ctx: WorkflowContext[AgentExecutorRequest | HumanReviewRequest],
+    ) -> None:
+        """フィードバックを状態に保存し、人間の承認を要求する。"""
         
-        print(f"\n{'='*60}")
-        print(f"反復 {iteration}: Reviewerのフィードバック")
-        print(f"{'='*60}")
-        print(reviewer_feedback)
+        # 反復回数を追跡
+        self._iteration += 1
+        iteration = self._iteration
         
         # 状態を更新
-        await ctx.set_state({
-            "iteration": iteration,
-            "current_draft": draft_content,
-            "reviewer_feedback": reviewer_feedback,
-        })
+        state = await self._state(ctx)
+        draft_content = state.current_draft
+        state.reviewer_feedback = reviewer_feedback
+        await self._flush_state(ctx)
         
         # 人間のレビューアーにリクエストを送信
         await ctx.send_message(
             HumanReviewRequest(
-                prompt=(
-                    "レビュー結果を確認してください。\n"
-                    "'approve' で承認、または修正指示を入力してください。"
-                ),
                 draft_content=draft_content,
                 reviewer_feedback=reviewer_feedback,
                 iteration=iteration,
@@ -140,33 +429,41 @@ class ReviewCoordinator(Executor):
     async def handle_human_decision(
         self,
         feedback: RequestResponse[HumanReviewRequest, str],
-        ctx: WorkflowContext[AgentExecutorRequest, str],
+        ctx: WorkflowContext[AgentExecutorRequest, ReviewResult],
     ) -> None:
         """人間の決定を処理し、承認または修正を実行する。"""
         
-        human_reply = (feedback.data or "").strip().lower()
-        state = await ctx.get_state() or {}
-        draft_content = cast(str, state.get("current_draft", ""))
+        state = await self._state(ctx)
+        draft_content = state.current_draft
         
-        print(f"\n{'='*60}")
-        print(f"人間の決定: {feedback.data}")
-        print(f"{'='*60}")
+        print(f"\n{_SEP}\n人間の決定: {feedback.data}\n{_SEP}")
         
-        if human_reply == "approve":
+        if _APPROVE_RE.match(feedback.data or ""):
             # 承認された場合、最終出力として提出
             print("\n✅ コンテンツが承認されました！")
-            await ctx.yield_output(draft_content)
+            await ctx.yield_output(ReviewResult(draft_content))
+            return
+        
+        if self._iteration >= self._max_iterations:
+            # 反復回数の上限に達した場合、Writerを呼ばずに人間が最後に確認した下書きを未承認として出力
+            print(f"\n⚠️ 反復回数の上限 ({self._max_iterations}) に達しました。最後の下書きを未承認のまま出力します")
+            await ctx.yield_output(ReviewResult(draft_content, approved=False))
             return
         
         # 修正指示がある場合、Writerに戻す
         print(f"\n🔄 修正指示あり。Writerに再作成を依頼します...")
         
-        revision_prompt = (
-            f"以下のフィードバックに基づいてコンテンツを修正してください:\n\n"
-            f"前回の下書き:\n{draft_content}\n\n"
-            f"Reviewerのフィードバック:\n{state.get('reviewer_feedback', '')}\n\n"
-            f"人間からの修正指示:\n{feedback.data}"
-        )
+        # 軽微な修正指示であれば、次の下書きはReviewerを経由せずに人間へ提示する
+        state.skip_reviewer = _is_minor_revision(feedback.data or "")
+        await self._flush_state(ctx)
+        
+        # WriterのAgentExecutorはスレッドを保持しており、前回の下書きは会話履歴にあるため、
+        # Writerがまだ知らない差分 (Reviewerのフィードバックと人間の指示) だけを送る
+        revision_prompt = f"人間からの修正指示:\n{feedback.data}"
+        reviewer_feedback = state.reviewer_feedback
+        # コンパクトモードの自己レビューは、Writer自身の会話履歴に含まれている
+        if self._reviewer_id and reviewer_feedback and reviewer_feedback != _SKIPPED_REVIEW_FEEDBACK:
+            revision_prompt = f"Reviewerのフィードバック:\n{reviewer_feedback}\n\n{revision_prompt}"
         
         await ctx.send_message(
             AgentExecutorRequest(
@@ -177,57 +474,202 @@ class ReviewCoordinator(Executor):
         )
 
 
-class DraftCapture(Executor):
-    """Writerからの下書きをキャプチャし、Reviewerに転送するエグゼキューター。"""
+class ReviewBatcher:
+    """Reviewerのプロンプトを蓄積し、Azure OpenAI Batch APIでまとめて処理する。
 
-    def __init__(self, reviewer_id: str, capture_id: str = "draft_capture"):
-        super().__init__(id=capture_id)
-        self._reviewer_id = reviewer_id
+    キューが max_batch_size 件に達するか、最初の要求から flush_interval 秒が経過すると
+    JSONLのバッチファイルをアップロードし、完了までポーリングして custom_id ごとに結果を返します。
+    Batch APIは通常の約50%の料金で課金されますが、完了までに最大24時間かかるため、
+    対話的でないバッチ実行でのみ使用してください。
+    """
 
-    @handler
-    async def capture_draft(
+    def __init__(
         self,
-        response: AgentExecutorResponse,
-        ctx: WorkflowContext[AgentExecutorRequest],
-    ) -> None:
-        """Writerの下書きを保存し、Reviewerに送信する。"""
+        client: AsyncAzureOpenAI,
+        deployment_name: str,
+        max_batch_size: int = 50,
+        flush_interval: float = 300.0,
+        poll_interval: float = 30.0,
+    ):
+        self._client = client
+        self._deployment_name = deployment_name
+        self._max_batch_size = max_batch_size
+        self._flush_interval = flush_interval
+        self._poll_interval = poll_interval
+        self._queue: asyncio.Queue[tuple[str, list[dict[str, str]], asyncio.Future[str]]] = asyncio.Queue()
+        self._collector: asyncio.Task[None] | None = None
+        self._flushes: set[asyncio.Task[None]] = set()
+
+    async def submit(self, custom_id: str, messages: list[dict[str, str]]) -> str:
+        """チャットメッセージをバッチに追加し、対応する応答テキストを待つ。"""
         
-        draft_content = response.agent_run_response.text or ""
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        await self._queue.put((custom_id, messages, future))
+        if self._collector is None:
+            self._collector = asyncio.create_task(self._collect())
+        return await future
+
+    async def aclose(self) -> None:
+        """バックグラウンドタスクを停止する。"""
         
-        print(f"\n{'='*60}")
-        print("Writerの下書き")
-        print(f"{'='*60}")
-        print(draft_content)
+        for task in (self._collector, *self._flushes):
+            if task is not None:
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            deadline = loop.time() + self._flush_interval
+            while len(pending) < self._max_batch_size:
+                try:
+                    pending.append(await asyncio.wait_for(self._queue.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            
+            # ポーリング中も次のバッチを受け付けられるよう、送信は別タスクで行う
+            flush = asyncio.create_task(self._flush(pending))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, pending: list[tuple[str, list[dict[str, str]], asyncio.Future[str]]]) -> None:
+        futures = {custom_id: future for custom_id, _, future in pending}
+        try:
+            lines = [
+                _json_dumps(
+                    {
+                        "custom_id": custom_id,
+                        "method": "POST",
+                        "url": "/chat/completions",
+                        "body": {"model": self._deployment_name, "messages": messages},
+                    }
+                )
+                for custom_id, messages, _ in pending
+            ]
+            batch_file = await self._client.files.create(
+                file=("reviewer_batch.jsonl", b"\n".join(lines)),
+                purpose="batch",
+            )
+            batch = await self._client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/chat/completions",
+                completion_window="24h",
+            )
+            print(f"\n📦 Reviewerのバッチ {batch.id} を送信しました ({len(pending)} 件)")
+            
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                await asyncio.sleep(self._poll_interval)
+                batch = await self._client.batches.retrieve(batch.id)
+            
+            # 成功した要求は出力ファイルに、失敗した要求はエラーファイルに書き込まれる
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    await self._resolve_results(file_id, futures)
+            
+            reason = f"バッチ {batch.id} が '{batch.status}' で終了しました"
+            if batch.errors and batch.errors.data:
+                reason += ": " + "; ".join(f"{error.code}: {error.message}" for error in batch.errors.data)
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(RuntimeError(reason))
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+
+    async def _resolve_results(self, file_id: str, futures: dict[str, asyncio.Future[str]]) -> None:
+        """バッチの結果ファイルを読み込み、custom_id ごとに応答テキストまたはエラーを設定する。"""
         
-        # 下書きを状態に保存
-        state = await ctx.get_state() or {}
-        await ctx.set_state({
-            **state,
-            "current_draft": draft_content,
-        })
+        content = await self._client.files.content(file_id)
+        for line in content.content.splitlines():
+            if not line.strip():
+                continue
+            result = _json_loads(line)
+            future = futures.pop(result["custom_id"], None)
+            if future is None or future.done():
+                continue
+            response = result.get("response") or {}
+            body = response.get("body") or {}
+            choices = body.get("choices")
+            if response.get("status_code") == 200 and choices:
+                future.set_result(choices[0]["message"]["content"] or "")
+            else:
+                # 200以外の応答のエラーは response.body.error に、要求自体の失敗は error に入る
+                error = body.get("error") or result.get("error")
+                future.set_exception(
+                    RuntimeError(f"バッチ要求 {result['custom_id']} が失敗しました: {error}")
+                )
+
+
+class BatchReviewer(Executor):
+    """ReviewBatcherを介してReviewerのレビューを実行するエグゼキューター。
+
+    AgentExecutorの代わりに使用し、同じAgentExecutorResponseを返します。
+    レビュー依頼には下書き全体が含まれるため、会話履歴は保持しません。
+    """
+
+    def __init__(self, batcher: ReviewBatcher, instructions: str, reviewer_id: str = "reviewer"):
+        super().__init__(id=reviewer_id)
+        self._batcher = batcher
+        self._instructions = instructions
+        self._iteration = 0
+
+    @handler
+    async def review(
+        self,
+        request: AgentExecutorRequest,
+        ctx: WorkflowContext[AgentExecutorResponse],
+    ) -> None:
+        """レビュー依頼をバッチに追加し、結果をAgentExecutorResponseとして送信する。"""
         
-        # Reviewerにレビュー依頼を送信
-        review_request = (
-            f"以下のコンテンツをレビューし、品質、明確さ、正確性について"
-            f"簡潔なフィードバックを提供してください:\n\n{draft_content}"
-        )
+        self._iteration += 1
+        messages = [{"role": "system", "content": self._instructions}]
+        messages.extend({"role": m.role.value, "content": m.text} for m in request.messages)
+        
+        # 複数のワークフローが同じバッチを共有するため、custom_idは一意にする
+        custom_id = f"{self.id}-{self._iteration}-{uuid.uuid4().hex[:8]}"
+        reviewer_feedback = await self._batcher.submit(custom_id, messages)
         
         await ctx.send_message(
-            AgentExecutorRequest(
-                messages=[ChatMessage(Role.USER, text=review_request)],
-                should_respond=True,
-            ),
-            target_id=self._reviewer_id,
+            AgentExecutorResponse(
+                self.id,
+                AgentRunResponse(messages=[ChatMessage(Role.ASSISTANT, text=reviewer_feedback)]),
+            )
         )
 
 
+# エクスポートしたワークフロー図をトポロジーのハッシュごとに保存するディレクトリ
+_VIZ_CACHE_DIR = Path(".viz_cache")
+
+
 def visualize_workflow(workflow, filename="workflow_diagram"):
+    # SKIP_VIZ が設定されている場合は図を生成しない
+    if os.environ.get("SKIP_VIZ"):
+        return None
+    
+    # トポロジーが変わらない限り、前回エクスポートしたSVGを再利用する (Graphvizの起動を省略)
+    # SVGは常に指定されたファイル名で出力し、トポロジーのハッシュだけを.viz_cacheに保存して比較する
+    topology = (
+        workflow.start_executor_id,
+        sorted((edge.source_id, edge.target_id) for group in workflow.edge_groups for edge in group.edges),
+    )
+    topo_hash = hashlib.md5(repr(topology).encode("utf-8")).hexdigest()
+    svg_file = Path(f"{filename}.svg")
+    hash_file = _VIZ_CACHE_DIR / f"{svg_file.name}.topology"
+    if svg_file.exists() and hash_file.exists() and hash_file.read_text() == topo_hash:
+        print(f"✅ 既存のワークフロー図 '{svg_file}' を使用します (トポロジーに変更なし)")
+        return str(svg_file)
+    
     # WorkflowVizオブジェクトを作成
     viz = WorkflowViz(workflow)
     
     # SVGファイルとして保存
     try:
         svg_path = viz.export(format="svg", filename=filename)
+        _VIZ_CACHE_DIR.mkdir(exist_ok=True)
+        hash_file.write_text(topo_hash)
         print(f"✅ ワークフロー図が '{svg_path}' に保存されました")
         return svg_path
         
@@ -239,133 +681,391 @@ def visualize_workflow(workflow, filename="workflow_diagram"):
     except Exception as e:
         print(f"❌ エラーが発生しました: {e}")
         return None
-    
-async def main() -> None:
-    """Writer-Reviewerワークフローを構築し、human-in-the-loopで実行する。"""
-    
-    print("Writer-Reviewer Human-in-the-Loop ワークフローを開始します")
-    print("="*60)
-    
-    # Azure OpenAI クライアントを作成
-    chat_client = AzureOpenAIChatClient(credential=AzureCliCredential())
-    
-    # Writerエージェントを作成
-    writer_agent = chat_client.create_agent(
-        name="Writer",
-        instructions=(
-            "あなたは優秀なコンテンツライターです。"
-            "明確で魅力的なコンテンツを作成し、フィードバックに基づいて改善してください。"
-        ),
-    )
-    
-    # Reviewerエージェントを作成
-    reviewer_agent = chat_client.create_agent(
-        name="Reviewer",
-        instructions=(
-            "あなたは経験豊富なコンテンツレビューアーです。"
-            "以下の観点から評価し、実行可能なフィードバックを提供してください:\n"
-            "1. 明確さ - 理解しやすいか?\n"
-            "2. 完全性 - トピックを十分にカバーしているか?\n"
-            "3. 正確性 - 情報は正しいか?\n"
-            "フィードバックは簡潔にしてください。"
-        ),
-    )
+
+
+def build_workflow(
+    writer_agent,
+    reviewer_agent,
+    batcher: ReviewBatcher | None = None,
+    compact: bool = COMPACT_MODE,
+) -> Workflow:
+    """Writer-Reviewerワークフローを構築する。
+
+    エグゼキューターは実行ごとに状態を持つため、ワークフローの実行ごとに新しく構築します。
+    batcherを指定した場合、ReviewerはBatch API経由で実行されます。
+    compactがTrueの場合はReviewerを含めず、Writerの自己レビューを使用します。
+    """
     
     # エグゼキューターを作成
     writer = AgentExecutor(writer_agent, id="writer")
-    reviewer = AgentExecutor(reviewer_agent, id="reviewer")
-    draft_capture = DraftCapture(reviewer_id=reviewer.id)
     request_info = RequestInfoExecutor(id="request_info")
+    
+    if compact:
+        coordinator = ReviewCoordinator(
+            writer_id=writer.id,
+            reviewer_id=None,
+            request_info_id=request_info.id,
+        )
+        
+        # Writer → Coordinator ⇄ RequestInfo
+        #    ↑          ↓
+        #    └── (修正が必要な場合)
+        return (
+            WorkflowBuilder()
+            .set_start_executor(writer)
+            .add_edge(writer, coordinator)
+            .add_edge(coordinator, request_info)
+            .add_edge(request_info, coordinator)
+            .add_edge(coordinator, writer)
+            .build()
+        )
+    
+    reviewer = (
+        BatchReviewer(batcher, REVIEWER_INSTRUCTIONS)
+        if batcher
+        else AgentExecutor(reviewer_agent, id="reviewer")
+    )
     coordinator = ReviewCoordinator(
         writer_id=writer.id,
+        reviewer_id=reviewer.id,
         request_info_id=request_info.id,
     )
     
     # ワークフローを構築
-    # Writer → DraftCapture → Reviewer → Coordinator → RequestInfo
-    #    ↑                                      ↓
-    #    └──────────── (修正が必要な場合) ──────┘
-    workflow = (
+    # Writer → Coordinator ⇄ Reviewer
+    #    ↑          ⇅
+    #    │     RequestInfo
+    #    └──── Coordinator (修正が必要な場合)
+    # レビュー済みの下書きや軽微な修正では、CoordinatorはReviewerを省略する
+    return (
         WorkflowBuilder()
         .set_start_executor(writer)
-        .add_edge(writer, draft_capture)
-        .add_edge(draft_capture, reviewer)
+        .add_edge(writer, coordinator)
+        .add_edge(coordinator, reviewer)
         .add_edge(reviewer, coordinator)
         .add_edge(coordinator, request_info)
         .add_edge(request_info, coordinator)
         .add_edge(coordinator, writer)
         .build()
     )
+
+
+class HumanRequestBroker:
+    """実行中の全ワークフローのHumanReviewRequestを集め、まとめて人間に提示する。
+    
+    最初のリクエストから collect_timeout 秒が経過するか、実行中の全ワークフローが
+    リクエストを出すまで待ち、番号付きの一覧として表示してから順に回答を読み取ります。
+    ワークフローごとに入力を待たせず、人間は一度にすべての判断を行えます。
+    """
+
+    def __init__(self, collect_timeout: float = 2.0):
+        self._collect_timeout = collect_timeout
+        self._pending: dict[str, tuple[asyncio.Future[str], str, HumanReviewRequest]] = {}
+        self._changed = asyncio.Event()
+        self._presenter: asyncio.Task[None] | None = None
+        self._active_workflows = 0
+        self._stdin_closed = False
+
+    def workflow_started(self) -> None:
+        self._active_workflows += 1
+
+    def workflow_finished(self) -> None:
+        self._active_workflows -= 1
+        self._changed.set()
+
+    async def ask(self, workflow_id: str, request_id: str, request: HumanReviewRequest) -> str:
+        """リクエストを登録し、人間の回答を待つ。
+        
+        標準入力が閉じられている場合はEOFErrorを送出します。
+        """
+        
+        if self._stdin_closed:
+            raise EOFError("標準入力が閉じられているため、人間の回答を取得できません")
+        
+        future: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, workflow_id, request)
+        self._changed.set()
+        if self._presenter is None:
+            self._presenter = asyncio.create_task(self._present())
+        return await future
+
+    async def _collect(self) -> list[tuple[asyncio.Future[str], str, HumanReviewRequest]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._collect_timeout
+        # 1つのワークフローが複数のリクエストを出すこともあるため、リクエスト数ではなくワークフロー数で判定する
+        while len({workflow_id for _, workflow_id, _ in self._pending.values()}) < self._active_workflows:
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+        
+        collected = list(self._pending.values())
+        self._pending.clear()
+        return collected
+
+    async def _present(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                collected = await self._collect()
+                
+                for index, (_, workflow_id, request) in enumerate(collected):
+                    print(f"\n{_SEP}\n[{index}] [{workflow_id}] 人間のレビューが必要 (反復 {request.iteration})\n{_SEP}")
+                    print(f"\n📝 下書き:\n{request.draft_content}")
+                    print(f"\n💬 Reviewerのフィードバック:\n{request.reviewer_feedback}")
+                    print(f"\n{request.prompt}")
+                
+                for index, (future, _, _) in enumerate(collected):
+                    print(f"\n[{index}] 入力してください ('approve' で承認、または修正指示): ", end="", flush=True)
+                    
+                    # input()はイベントループをブロックするため、別スレッドで標準入力を読み取る
+                    line = await loop.run_in_executor(None, sys.stdin.readline)
+                    if not line:
+                        # EOF: 空の修正指示として扱わず、回答待ちの全リクエストを失敗させる
+                        self._fail_all(collected)
+                        return
+                    future.set_result(line.strip())
+        finally:
+            self._presenter = None
+
+    def _fail_all(self, collected: list[tuple[asyncio.Future[str], str, HumanReviewRequest]]) -> None:
+        self._stdin_closed = True
+        print()
+        for future, _, _ in [*collected, *self._pending.values()]:
+            if not future.done():
+                future.set_exception(EOFError("標準入力が閉じられたため、人間の回答を取得できません"))
+        self._pending.clear()
+
+
+# ストリーミング表示するエージェントの出力の見出し
+_STREAM_TITLES = {
+    "writer": "Writerの下書き",
+    "reviewer": "Reviewerのフィードバック",
+}
+
+
+async def _run_one(
+    task: str,
+    writer_agent,
+    reviewer_agent,
+    workflow_id: str = "workflow",
+    batcher: ReviewBatcher | None = None,
+    broker: HumanRequestBroker | None = None,
+    stream_tokens: bool = not COMPACT_MODE,
+) -> ReviewResult | None:
+    """1つの初期タスクについてワークフローを実行し、最終出力を返す。
+
+    複数のワークフローを並行実行する場合は、出力が混ざらないようにstream_tokens=Falseを指定する。
+    コンパクトモードのWriterはトークン単位ではJSONの断片しか返さないため、既定ではストリーミング表示しない。
+    """
     
-    visualize_workflow(workflow, "HumanInTheLoop_Workflow")
-    # ワークフローを実行
-    initial_task = "手頃な価格で楽しい新型電動SUVのスローガンを作成してください。"
+    workflow = build_workflow(writer_agent, reviewer_agent, batcher)
+    broker = broker or HumanRequestBroker()
     
     pending_responses: dict[str, str] | None = None
     completed = False
-    final_output: str | None = None
+    final_output: ReviewResult | None = None
     
-    print(f"\n初期タスク: {initial_task}")
+    print(f"\n[{workflow_id}] 初期タスク: {task}")
     
-    while not completed:
-        # 最初の反復ではrun_streamを使用、以降はsend_responses_streamingを使用
-        stream = (
-            workflow.send_responses_streaming(pending_responses)
-            if pending_responses
-            else workflow.run_stream(initial_task)
-        )
-        
-        pending_requests: list[tuple[str, HumanReviewRequest]] = []
-        
-        async for event in stream:
-            if isinstance(event, RequestInfoEvent):
-                # 人間の入力が必要
-                if isinstance(event.data, HumanReviewRequest):
-                    pending_requests.append((event.request_id, event.data))
-            
-            elif isinstance(event, WorkflowOutputEvent):
-                # ワークフローが完了
-                final_output = cast(str, event.data)
-                completed = True
+    broker.workflow_started()
+    try:
+        while not completed:
+            # 最初の反復ではrun_streamを使用、以降はsend_responses_streamingを使用
+            stream = (
+                workflow.send_responses_streaming(pending_responses)
+                if pending_responses
+                else workflow.run_stream(task)
+            )
             
-            elif isinstance(event, WorkflowStatusEvent):
-                if event.state in (
-                    WorkflowRunState.IDLE_WITH_PENDING_REQUESTS,
-                    WorkflowRunState.IN_PROGRESS_PENDING_REQUESTS,
-                ):
-                    # 人間の入力を待機中
-                    pass
-        
-        # 保留中のリクエストがある場合、人間の入力を収集
-        if pending_requests and not completed:
-            pending_responses = {}
+            pending_requests: list[tuple[str, HumanReviewRequest]] = []
+            streaming_executor_id: str | None = None
             
-            for request_id, request_data in pending_requests:
-                print(f"\n{'='*60}")
-                print(f"人間のレビューが必要 (反復 {request_data.iteration})")
-                print(f"{'='*60}")
-                print(f"\n📝 下書き:\n{request_data.draft_content}")
-                print(f"\n💬 Reviewerのフィードバック:\n{request_data.reviewer_feedback}")
-                print(f"\n{request_data.prompt}")
-                print("\n入力してください ('approve' で承認、または修正指示): ", end="", flush=True)
+            async for event in stream:
+                if isinstance(event, AgentRunUpdateEvent):
+                    if not stream_tokens:
+                        continue
+                    # エージェントの応答をトークン単位で表示し、生成完了を待たずに読めるようにする
+                    if event.executor_id != streaming_executor_id:
+                        streaming_executor_id = event.executor_id
+                        title = _STREAM_TITLES.get(streaming_executor_id, streaming_executor_id)
+                        print(f"\n{_SEP}\n[{workflow_id}] {title}\n{_SEP}")
+                    if event.data is not None:
+                        sys.stdout.write(event.data.text)
+                        sys.stdout.flush()
                 
-                user_input = input().strip()
-                pending_responses[request_id] = user_input
-        else:
-            # 保留中のリクエストがない場合は完了
-            if not completed:
-                completed = True
-            pending_responses = None
+                elif isinstance(event, RequestInfoEvent):
+                    # 人間の入力が必要
+                    if isinstance(event.data, HumanReviewRequest):
+                        pending_requests.append((event.request_id, event.data))
+                
+                elif isinstance(event, WorkflowOutputEvent):
+                    # ワークフローが完了
+                    final_output = cast(ReviewResult, event.data)
+                    completed = True
+                
+                elif isinstance(event, WorkflowStatusEvent):
+                    if event.state in (
+                        WorkflowRunState.IDLE_WITH_PENDING_REQUESTS,
+                        WorkflowRunState.IN_PROGRESS_PENDING_REQUESTS,
+                    ):
+                        # 人間の入力を待機中
+                        pass
+            
+            # 保留中のリクエストがある場合、人間の入力を収集
+            if pending_requests and not completed:
+                answers = await asyncio.gather(
+                    *(broker.ask(workflow_id, request_id, request) for request_id, request in pending_requests)
+                )
+                pending_responses = {
+                    request_id: answer for (request_id, _), answer in zip(pending_requests, answers)
+                }
+            else:
+                # 保留中のリクエストがない場合は完了
+                if not completed:
+                    completed = True
+                pending_responses = None
+    finally:
+        # 終了したワークフローの分だけ、ブローカーが待つリクエスト数を減らす
+        broker.workflow_finished()
+    
+    return final_output
+
+
+async def run_batch(
+    tasks: list[str],
+    writer_agent,
+    reviewer_agent,
+    max_concurrency: int = 10,
+    batch_reviewer: bool = REVIEWER_BATCH_MODE,
+) -> list[ReviewResult | BaseException | None]:
+    """複数の初期タスクに対してワークフローを並行実行する。
+
+    WriterとReviewerのLLM呼び出しはイベントループ上で重なり合い、
+    同時実行数は max_concurrency で制限されます。結果は tasks と同じ順序で返し、
+    失敗したタスクの位置にはその例外が入ります。
+    人間へのレビュー依頼は1つのHumanRequestBrokerでまとめて提示します。
+    batch_reviewer が True の場合、全ワークフローのReviewerは1つのReviewBatcherを共有します。
+    Batch APIはGlobal-BatchまたはDataZone-Batchのデプロイにのみ送信できるため、
+    AZURE_OPENAI_BATCH_DEPLOYMENT_NAME にそのデプロイ名を設定してください。
+    """
+    
+    batch_deployment = os.getenv("AZURE_OPENAI_BATCH_DEPLOYMENT_NAME")
+    if batch_reviewer and not batch_deployment:
+        raise RuntimeError(
+            "REVIEWER_BATCH_MODE には AZURE_OPENAI_BATCH_DEPLOYMENT_NAME "
+            "(Global-Batch/DataZone-Batchのデプロイ名) の設定が必要です"
+        )
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+    batcher = (
+        ReviewBatcher(
+            AsyncAzureOpenAI(
+                azure_endpoint=ENV.endpoint,
+                azure_ad_token_provider=_TOKEN_PROVIDER,
+                api_version=os.getenv("AZURE_OPENAI_BATCH_API_VERSION", "2024-10-21"),
+            ),
+            batch_deployment,
+            # 同時に待てるレビューは最大でも実行中のワークフロー数までなので、サイズによる送信が発動するよう上限を合わせる
+            max_batch_size=min(50, max_concurrency, len(tasks)),
+        )
+        if batch_reviewer
+        else None
+    )
+    
+    broker = HumanRequestBroker()
+    
+    async def _bounded(index: int, task: str) -> ReviewResult | None:
+        async with semaphore:
+            return await _run_one(
+                task,
+                writer_agent,
+                reviewer_agent,
+                workflow_id=f"task-{index}",
+                batcher=batcher,
+                broker=broker,
+                stream_tokens=False,
+            )
+    
+    try:
+        # 1つのタスクの失敗で他のワークフローを中断しないよう、例外もタスクごとの結果として返す
+        return await asyncio.gather(
+            *[_bounded(i, t) for i, t in enumerate(tasks)], return_exceptions=True
+        )
+    finally:
+        if batcher:
+            await batcher.aclose()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_agents() -> tuple[ChatAgent, ChatAgent | None]:
+    """WriterとReviewerのエージェントを作成する。
+    
+    同じプロセス内で繰り返し実行しても、クライアントとエージェントは1度だけ作成します。
+    コンパクトモードではReviewerを使用しないため、Reviewerの代わりにNoneを返します。
+    """
+    
+    # Azure OpenAI クライアントを作成 (トークンは_TOKEN_PROVIDERが期限切れの前に更新する)
+    chat_client = AzureOpenAIChatClient(
+        deployment_name=ENV.deployment,
+        endpoint=ENV.endpoint,
+        ad_token_provider=_TOKEN_PROVIDER,
+    )
+    
+    if COMPACT_MODE:
+        # 下書きと自己レビューを構造化出力で受け取る
+        writer_agent = chat_client.create_agent(
+            name="Writer",
+            instructions=COMPACT_WRITER_INSTRUCTIONS,
+            response_format=CompactDraft,
+        )
+        return writer_agent, None
+    
+    # Writerエージェントを作成
+    writer_agent = chat_client.create_agent(
+        name="Writer",
+        instructions=WRITER_INSTRUCTIONS,
+    )
+    
+    # Reviewerエージェントを作成
+    reviewer_agent = chat_client.create_agent(
+        name="Reviewer",
+        instructions=REVIEWER_INSTRUCTIONS,
+    )
+    
+    return writer_agent, reviewer_agent
+
+
+async def main() -> None:
+    """Writer-Reviewerワークフローを構築し、human-in-the-loopで実行する。"""
+    
+    print("Writer-Reviewer Human-in-the-Loop ワークフローを開始します")
+    print(_SEP)
+    
+    writer_agent, reviewer_agent = _get_agents()
+    
+    visualize_workflow(build_workflow(writer_agent, reviewer_agent), "HumanInTheLoop_Workflow")
+    # コマンドライン引数でタスクが指定されていればそれを使用し、複数あれば並行実行する
+    tasks = sys.argv[1:] or ["手頃な価格で楽しい新型電動SUVのスローガンを作成してください。"]
+    
+    if len(tasks) == 1:
+        results: list[ReviewResult | BaseException | None] = [
+            await _run_one(tasks[0], writer_agent, reviewer_agent)
+        ]
+    else:
+        results = await run_batch(tasks, writer_agent, reviewer_agent)
     
     # 最終結果を表示
-    if final_output:
-        print(f"\n{'='*60}")
-        print("✨ 最終承認コンテンツ")
-        print(f"{'='*60}")
-        print(final_output)
-        print(f"\n{'='*60}")
-        print("ワークフロー完了!")
-        print(f"{'='*60}")
+    for index, (task, result) in enumerate(zip(tasks, results)):
+        if len(tasks) > 1:
+            print(f"\n[task-{index}] {task}")
+        if isinstance(result, BaseException):
+            print(f"\n❌ ワークフローが失敗しました: {result!r}")
+        elif result:
+            print(_HEADER_FINAL_OUTPUT if result.approved else _HEADER_UNAPPROVED_OUTPUT)
+            print(result.content)
+    print(_FOOTER_COMPLETED)
 
 
 if __name__ == "__main__":